@@ -9,6 +9,7 @@ import numpy as np
 import tempfile
 import os
 import sys
+import importlib.util
 from datetime import datetime, timedelta
 from unittest.mock import patch, MagicMock
 
@@ -21,46 +22,84 @@ except ImportError:
     # Fallback for testing environment
     CustomerSegmentationModel = None
 
+# Check for MLflow without importing it; the import is heavy and only the
+# MLflow logging test needs it
+_HAS_MLFLOW = importlib.util.find_spec('mlflow') is not None
+
+# Use RAM-backed /dev/shm for model save/load round-trips when available;
+# None falls back to the default temp directory
+_TMPFS = '/dev/shm' if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK) else None
+
+def _generate_transactions(rng, customer_ids, count_range, day_range, lognormal_params):
+    """Generate a transactions frame for a group of customers in one shot.
+
+    Per-customer transaction counts, dates and amounts are drawn as whole
+    arrays rather than appended row by row.
+    """
+    counts = rng.integers(*count_range, size=len(customer_ids))
+    n_rows = counts.sum()
+    days = rng.integers(*day_range, size=n_rows)
+
+    return pd.DataFrame({
+        'customer_id': np.repeat(customer_ids, counts),
+        'transaction_date': pd.Timestamp('2023-01-01') + pd.to_timedelta(days, unit='D'),
+        'net_amount': rng.lognormal(*lognormal_params, size=n_rows)
+    })
+
 class TestCustomerSegmentationModel(unittest.TestCase):
     """Test cases for the CustomerSegmentationModel class."""
     
-    def setUp(self):
-        """Set up test fixtures before each test method."""
+    _CUST_IDS = np.array([f'CUST_{i:06d}' for i in range(1, 21)])
+    
+    @classmethod
+    def setUpClass(cls):
+        """Build sample data and RFM features once for the whole class."""
         if CustomerSegmentationModel is None:
-            self.skipTest("CustomerSegmentationModel not available")
-        
-        self.model = CustomerSegmentationModel(n_clusters=3, random_state=42)
-        
+            raise unittest.SkipTest("CustomerSegmentationModel not available")
+
         # Create sample transaction data
-        np.random.seed(42)
+        rng = np.random.default_rng(42)
         n_transactions = 100
-        n_customers = 20
-        
-        customer_ids = [f'CUST_{i:06d}' for i in range(1, n_customers + 1)]
-        
-        self.sample_data = pd.DataFrame({
-            'customer_id': np.random.choice(customer_ids, n_transactions),
-            'transaction_date': pd.date_range('2023-01-01', periods=n_transactions, freq='D')[:n_transactions],
-            'net_amount': np.random.lognormal(4, 1, n_transactions)
+        customer_ids = cls._CUST_IDS
+
+        # Ensure we have multiple transactions per customer by adding three
+        # more for each of the first 10 customers
+        main_ids = rng.choice(customer_ids, n_transactions)
+        main_dates = pd.date_range('2023-01-01', periods=n_transactions, freq='D')
+        main_amounts = rng.lognormal(4, 1, n_transactions)
+
+        extra_ids = np.repeat(customer_ids[:10], 3)
+        extra_dates = pd.Timestamp('2023-01-01') + pd.to_timedelta(
+            rng.integers(0, 365, size=len(extra_ids)), unit='D'
+        )
+        extra_amounts = rng.lognormal(4, 1, len(extra_ids))
+
+        cls._sample_data = pd.DataFrame({
+            'customer_id': np.concatenate([main_ids, extra_ids]),
+            'transaction_date': main_dates.append(extra_dates),
+            'net_amount': np.concatenate([main_amounts, extra_amounts])
         })
-        
-        # Ensure we have multiple transactions per customer
-        additional_transactions = []
-        for customer_id in customer_ids[:10]:  # Add more transactions for first 10 customers
-            for i in range(3):
-                additional_transactions.append({
-                    'customer_id': customer_id,
-                    'transaction_date': pd.Timestamp('2023-01-01') + pd.Timedelta(days=np.random.randint(0, 365)),
-                    'net_amount': np.random.lognormal(4, 1)
-                })
-        
-        self.sample_data = pd.concat([
-            self.sample_data, 
-            pd.DataFrame(additional_transactions)
-        ], ignore_index=True)
-        
-        # Calculate RFM features for testing
-        self.rfm_data = self.model.calculate_rfm_features(self.sample_data)
+
+        # Calculate RFM features once; they are shared across all tests
+        cls._rfm_data = CustomerSegmentationModel(n_clusters=3, random_state=42).calculate_rfm_features(cls._sample_data)
+        cls._fitted = None
+
+    @classmethod
+    def _fitted_model(cls):
+        """Return a model fitted to the shared RFM data, fitting it on first use.
+
+        Only for tests that do not mutate the model or re-fit it.
+        """
+        if cls._fitted is None:
+            cls._fitted = CustomerSegmentationModel(n_clusters=3, random_state=42)
+            cls._fitted.fit(cls._rfm_data.copy(), find_optimal_k=False)
+        return cls._fitted
+
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.model = CustomerSegmentationModel(n_clusters=3, random_state=42)
+        self.sample_data = self._sample_data
+        self.rfm_data = self._rfm_data.copy()
     
     def test_model_initialization(self):
         """Test model initialization with default parameters."""
@@ -114,9 +153,10 @@ class TestCustomerSegmentationModel(unittest.TestCase):
             self.assertIn(col, rfm_with_scores.columns, f"Column {col} missing from RFM scores")
         
         # Check score ranges (1-5)
-        self.assertTrue((rfm_with_scores['recency_score'].between(1, 5)).all())
-        self.assertTrue((rfm_with_scores['frequency_score'].between(1, 5)).all())
-        self.assertTrue((rfm_with_scores['monetary_score'].between(1, 5)).all())
+        for col in ['recency_score', 'frequency_score', 'monetary_score']:
+            scores = rfm_with_scores[col].to_numpy()
+            self.assertGreaterEqual(scores.min(), 1, f"{col} below 1")
+            self.assertLessEqual(scores.max(), 5, f"{col} above 5")
         
         # Check RFM score format (3-digit string)
         self.assertTrue(rfm_with_scores['rfm_score'].str.len().eq(3).all())
@@ -194,8 +234,8 @@ class TestCustomerSegmentationModel(unittest.TestCase):
     
     def test_prediction(self):
         """Test model prediction functionality."""
-        # Fit model first
-        self.model.fit(self.rfm_data, find_optimal_k=False)
+        # Reuse the shared fitted model
+        self.model = self._fitted_model()
         
         # Make predictions
         predictions = self.model.predict(self.rfm_data)
@@ -211,8 +251,8 @@ class TestCustomerSegmentationModel(unittest.TestCase):
     
     def test_customer_insights(self):
         """Test customer insights generation."""
-        # Fit model first
-        self.model.fit(self.rfm_data, find_optimal_k=False)
+        # Reuse the shared fitted model
+        self.model = self._fitted_model()
         predictions = self.model.predict(self.rfm_data)
         
         # Generate insights
@@ -225,20 +265,21 @@ class TestCustomerSegmentationModel(unittest.TestCase):
             self.assertIn(col, insights.columns)
         
         # Check that percentiles are in valid range
-        self.assertTrue((insights['recency_percentile'].between(0, 1)).all())
-        self.assertTrue((insights['frequency_percentile'].between(0, 1)).all())
-        self.assertTrue((insights['monetary_percentile'].between(0, 1)).all())
+        for col in ['recency_percentile', 'frequency_percentile', 'monetary_percentile']:
+            percentiles = insights[col].to_numpy()
+            self.assertGreaterEqual(percentiles.min(), 0, f"{col} below 0")
+            self.assertLessEqual(percentiles.max(), 1, f"{col} above 1")
         
         # Check that recommendations are provided
         self.assertTrue(insights['recommendations'].notna().all())
     
     def test_save_and_load_model(self):
         """Test model saving and loading functionality."""
-        # Fit model first
-        self.model.fit(self.rfm_data, find_optimal_k=False)
+        # Reuse the shared fitted model
+        self.model = self._fitted_model()
         
         # Save model to temporary directory
-        with tempfile.TemporaryDirectory() as temp_dir:
+        with tempfile.TemporaryDirectory(dir=_TMPFS) as temp_dir:
             model_path = os.path.join(temp_dir, 'test_model')
             self.model.save_model(model_path)
             
@@ -264,35 +305,35 @@ class TestCustomerSegmentationModel(unittest.TestCase):
     
     def test_save_model_without_fitting(self):
         """Test that saving raises error when model is not fitted."""
-        with tempfile.TemporaryDirectory() as temp_dir:
+        with tempfile.TemporaryDirectory(dir=_TMPFS) as temp_dir:
             model_path = os.path.join(temp_dir, 'test_model')
             with self.assertRaises(ValueError):
                 self.model.save_model(model_path)
     
-    @patch('mlflow.start_run')
-    @patch('mlflow.log_param')
-    @patch('mlflow.log_metric')
-    @patch('mlflow.sklearn.log_model')
-    @patch('mlflow.log_artifact')
-    def test_mlflow_logging(self, mock_log_artifact, mock_log_model, 
-                           mock_log_metric, mock_log_param, mock_start_run):
+    @unittest.skipUnless(_HAS_MLFLOW, "mlflow not installed")
+    def test_mlflow_logging(self):
         """Test MLflow logging functionality."""
-        # Setup mock context manager
-        mock_start_run.return_value.__enter__ = MagicMock()
-        mock_start_run.return_value.__exit__ = MagicMock()
-        
-        # Fit model first
-        self.model.fit(self.rfm_data, find_optimal_k=False)
-        
-        # Log to MLflow
-        self.model.log_to_mlflow()
-        
-        # Check that MLflow functions were called
-        mock_start_run.assert_called_once()
-        mock_log_param.assert_called()
-        mock_log_metric.assert_called()
-        mock_log_model.assert_called_once()
-        mock_log_artifact.assert_called_once()
+        with patch('mlflow.start_run') as mock_start_run, \
+                patch('mlflow.log_param') as mock_log_param, \
+                patch('mlflow.log_metric') as mock_log_metric, \
+                patch('mlflow.sklearn.log_model') as mock_log_model, \
+                patch('mlflow.log_artifact') as mock_log_artifact:
+            # Setup mock context manager
+            mock_start_run.return_value.__enter__ = MagicMock()
+            mock_start_run.return_value.__exit__ = MagicMock()
+            
+            # Fit model first
+            self.model.fit(self.rfm_data, find_optimal_k=False)
+            
+            # Log to MLflow
+            self.model.log_to_mlflow()
+            
+            # Check that MLflow functions were called
+            mock_start_run.assert_called_once()
+            mock_log_param.assert_called()
+            mock_log_metric.assert_called()
+            mock_log_model.assert_called_once()
+            mock_log_artifact.assert_called_once()
     
     def test_mlflow_logging_without_fitting(self):
         """Test that MLflow logging raises error when model is not fitted."""
@@ -301,20 +342,16 @@ class TestCustomerSegmentationModel(unittest.TestCase):
     
     def test_assign_rfm_segment(self):
         """Test RFM segment assignment logic."""
-        # Test Champions segment
-        row_champions = pd.Series({'recency_score': 5, 'frequency_score': 5, 'monetary_score': 5})
-        segment = self.model._assign_rfm_segment(row_champions)
-        self.assertEqual(segment, 'Champions')
-        
-        # Test Lost Customers segment
-        row_lost = pd.Series({'recency_score': 1, 'frequency_score': 1, 'monetary_score': 1})
-        segment = self.model._assign_rfm_segment(row_lost)
-        self.assertEqual(segment, 'Lost Customers')
-        
-        # Test New Customers segment
-        row_new = pd.Series({'recency_score': 5, 'frequency_score': 1, 'monetary_score': 3})
-        segment = self.model._assign_rfm_segment(row_new)
-        self.assertEqual(segment, 'New Customers')
+        cases = [
+            ({'recency_score': 5, 'frequency_score': 5, 'monetary_score': 5}, 'Champions'),
+            ({'recency_score': 1, 'frequency_score': 1, 'monetary_score': 1}, 'Lost Customers'),
+            ({'recency_score': 5, 'frequency_score': 1, 'monetary_score': 3}, 'New Customers'),
+        ]
+        
+        for scores, expected in cases:
+            with self.subTest(expected=expected):
+                segment = self.model._assign_rfm_segment(pd.Series(scores))
+                self.assertEqual(segment, expected)
     
     def test_generate_recommendations(self):
         """Test recommendation generation for different customer segments."""
@@ -369,48 +406,29 @@ class TestCustomerSegmentationModel(unittest.TestCase):
 class TestCustomerSegmentationIntegration(unittest.TestCase):
     """Integration tests for the CustomerSegmentationModel."""
     
-    def setUp(self):
-        """Set up integration test fixtures."""
+    _HIGH_IDS = np.array([f'HIGH_{i:03d}' for i in range(10)])
+    _LOW_IDS = np.array([f'LOW_{i:03d}' for i in range(10)])
+    _MED_IDS = np.array([f'MED_{i:03d}' for i in range(20)])
+    _SCALE_IDS = np.array([f'SCALE_{i:03d}' for i in range(100)])
+    
+    @classmethod
+    def setUpClass(cls):
+        """Set up integration test fixtures once for the whole class."""
         if CustomerSegmentationModel is None:
-            self.skipTest("CustomerSegmentationModel not available")
+            raise unittest.SkipTest("CustomerSegmentationModel not available")
         
         # Create more realistic sample data
-        np.random.seed(42)
+        rng = np.random.default_rng(42)
         
         # Generate customers with different behavior patterns
-        customers = []
-        
-        # High-value customers (Champions)
-        for i in range(10):
-            customer_id = f'HIGH_{i:03d}'
-            for j in range(np.random.randint(15, 25)):  # High frequency
-                customers.append({
-                    'customer_id': customer_id,
-                    'transaction_date': pd.Timestamp('2023-01-01') + pd.Timedelta(days=np.random.randint(0, 30)),  # Recent
-                    'net_amount': np.random.lognormal(5.5, 0.5)  # High monetary
-                })
-        
-        # Low-value customers (Lost)
-        for i in range(10):
-            customer_id = f'LOW_{i:03d}'
-            for j in range(np.random.randint(1, 3)):  # Low frequency
-                customers.append({
-                    'customer_id': customer_id,
-                    'transaction_date': pd.Timestamp('2023-01-01') + pd.Timedelta(days=np.random.randint(300, 365)),  # Old
-                    'net_amount': np.random.lognormal(3, 0.5)  # Low monetary
-                })
-        
-        # Medium customers
-        for i in range(20):
-            customer_id = f'MED_{i:03d}'
-            for j in range(np.random.randint(5, 10)):  # Medium frequency
-                customers.append({
-                    'customer_id': customer_id,
-                    'transaction_date': pd.Timestamp('2023-01-01') + pd.Timedelta(days=np.random.randint(60, 180)),  # Medium recency
-                    'net_amount': np.random.lognormal(4.5, 0.5)  # Medium monetary
-                })
-        
-        self.integration_data = pd.DataFrame(customers)
+        cls.integration_data = pd.concat([
+            # High-value customers (Champions): high frequency, recent, high monetary
+            _generate_transactions(rng, cls._HIGH_IDS, (15, 25), (0, 30), (5.5, 0.5)),
+            # Low-value customers (Lost): low frequency, old, low monetary
+            _generate_transactions(rng, cls._LOW_IDS, (1, 3), (300, 365), (3, 0.5)),
+            # Medium customers
+            _generate_transactions(rng, cls._MED_IDS, (5, 10), (60, 180), (4.5, 0.5))
+        ], ignore_index=True)
     
     def test_end_to_end_workflow(self):
         """Test complete end-to-end workflow."""
@@ -468,19 +486,8 @@ class TestCustomerSegmentationIntegration(unittest.TestCase):
     def test_scalability(self):
         """Test model performance with larger datasets."""
         # Create larger dataset
-        np.random.seed(42)
-        large_customers = []
-        
-        for i in range(100):  # 100 customers
-            customer_id = f'SCALE_{i:03d}'
-            for j in range(np.random.randint(1, 20)):  # Variable transaction count
-                large_customers.append({
-                    'customer_id': customer_id,
-                    'transaction_date': pd.Timestamp('2023-01-01') + pd.Timedelta(days=np.random.randint(0, 365)),
-                    'net_amount': np.random.lognormal(4, 1)
-                })
-        
-        large_data = pd.DataFrame(large_customers)
+        rng = np.random.default_rng(42)
+        large_data = _generate_transactions(rng, self._SCALE_IDS, (1, 20), (0, 365), (4, 1))  # 100 customers
         
         # Test that model can handle larger dataset
         model = CustomerSegmentationModel(n_clusters=5, random_state=42)